@@ -1,10 +1,16 @@
-from pydoc import html
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from html import escape
+from flask import Flask, g, render_template, request, session, redirect, url_for
+import atexit
+import hashlib
+import json
+import operator
 import os
-import pickle
+import queue
 import sqlite3
-import pandas as pd
-import numpy as np
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, partial
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from ml_pipeline import MODEL_FEATURES  # features per disease
@@ -16,6 +22,22 @@ except Exception:
     bcrypt = None
     _HAS_BCRYPT = False
 
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+    _argon2 = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+    _HAS_ARGON2 = True
+except Exception:
+    _argon2 = None
+    _HAS_ARGON2 = False
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except Exception:
+    orjson = None
+    _HAS_ORJSON = False
+
 # --------------------------------------------------
 # App setup
 # --------------------------------------------------
@@ -26,11 +48,217 @@ DATABASE = "database.db"
 # --------------------------------------------------
 # Database helper
 # --------------------------------------------------
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+_db_pool = queue.Queue()
+_db_open = 0  # connections created so far, never more than DB_POOL_SIZE
+_db_lock = threading.Lock()
+
+def _connect_db():
+    conn = sqlite3.connect(DATABASE, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
+def _checkout_db():
+    """
+    Take an idle pooled connection. Opens a new one while fewer than
+    DB_POOL_SIZE exist, otherwise waits for one to be returned.
+    """
+    global _db_open
+    while True:
+        try:
+            return _db_pool.get_nowait()
+        except queue.Empty:
+            pass
+        with _db_lock:
+            if _db_open < DB_POOL_SIZE:
+                conn = _connect_db()
+                if _db_open == 0:
+                    # journal_mode is stored in the database file, so once is enough
+                    conn.execute("PRAGMA journal_mode=WAL")
+                _db_open += 1
+                return conn
+        try:
+            return _db_pool.get(timeout=1)
+        except queue.Empty:
+            continue
+
+def get_db_connection():
+    """
+    Return the pooled SQLite connection for the current app context,
+    checking one out on first use. close_db_connection returns it.
+    """
+    if "db" not in g:
+        g.db = _checkout_db()
+    return g.db
+
+@app.teardown_appcontext
+def close_db_connection(exc):
+    global _db_open
+    conn = g.pop("db", None)
+    if conn is None:
+        return
+    try:
+        # Uncommitted work (an error, or a write that was never committed)
+        # must not keep holding the database write lock
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        with _db_lock:
+            _db_open -= 1
+        return
+    _db_pool.put(conn)
+
+@atexit.register
+def _close_db_pool():
+    while True:
+        try:
+            _db_pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+# --------------------------------------------------
+# Background prediction writer
+# --------------------------------------------------
+_PREDICTION_INSERT = "INSERT INTO predictions (user_id, disease, input_data, result) VALUES (?, ?, ?, ?)"
+_PREDICTION_BATCH = 100
+_PREDICTION_RETRIES = 3
+_prediction_queue = queue.Queue()
+
+def _write_predictions(conn, block=True):
+    """Insert queued prediction rows in batches of up to _PREDICTION_BATCH."""
+    while True:
+        try:
+            batch = [_prediction_queue.get(block=block)]
+        except queue.Empty:
+            return
+        try:
+            while len(batch) < _PREDICTION_BATCH:
+                batch.append(_prediction_queue.get_nowait())
+        except queue.Empty:
+            pass
+        rows = [(user_id, disease, json.dumps(inputs, separators=(',', ':'), ensure_ascii=False), result)
+                for user_id, disease, inputs, result in batch]
+        _insert_predictions(conn, rows)
+
+def _insert_predictions(conn, rows):
+    """
+    Insert one batch, rolling back and retrying on errors such as a
+    briefly locked database. A batch is only dropped, with a log line,
+    after _PREDICTION_RETRIES failed attempts.
+    """
+    for attempt in range(1, _PREDICTION_RETRIES + 1):
+        try:
+            conn.executemany(_PREDICTION_INSERT, rows)
+            conn.commit()
+            return
+        except sqlite3.Error as e:
+            # Release the write lock before trying again
+            conn.rollback()
+            if attempt == _PREDICTION_RETRIES:
+                print(f"[Error] Lost {len(rows)} prediction(s) after {attempt} attempts: {e}")
+            else:
+                print(f"[Warning] Saving {len(rows)} prediction(s) failed (attempt {attempt}): {e}")
+                time.sleep(0.5 * attempt)
+
+def _prediction_writer():
+    # The writer runs outside any app context, so it keeps its own connection
+    _write_predictions(_connect_db())
+
+_writer_lock = threading.Lock()
+_writer_pid = None
+
+def _start_writer():
+    """
+    Start the writer thread on first use in this process. Forked workers
+    (e.g. gunicorn --preload) don't inherit the parent's thread, hence the
+    pid check; merely importing app starts nothing.
+    """
+    global _writer_pid
+    pid = os.getpid()
+    if _writer_pid == pid:
+        return
+    with _writer_lock:
+        if _writer_pid != pid:
+            threading.Thread(target=_prediction_writer, name="prediction-writer", daemon=True).start()
+            _writer_pid = pid
+
+def save_prediction(user_id, disease, inputs, result):
+    """
+    Queue a prediction row; the background writer persists it, storing
+    `inputs` as compact JSON.
+    """
+    _start_writer()
+    _prediction_queue.put((user_id, disease, inputs, result))
+
+@atexit.register
+def _flush_predictions():
+    if _prediction_queue.empty():
+        return
+    conn = _connect_db()
+    try:
+        _write_predictions(conn, block=False)
+    finally:
+        conn.close()
+
+# --------------------------------------------------
+# Password hashing
+# --------------------------------------------------
+# PBKDF2 rounds used when argon2 is unavailable; unset keeps werkzeug's default
+PBKDF2_ITERATIONS = os.environ.get("PBKDF2_ITERS")
+
+def hash_password(password):
+    """Hash a new password with argon2 if installed, else pbkdf2:sha256."""
+    if _HAS_ARGON2:
+        return _argon2.hash(password)
+    method = 'pbkdf2:sha256'
+    if PBKDF2_ITERATIONS:
+        method = f'{method}:{PBKDF2_ITERATIONS}'
+    return generate_password_hash(password, method=method)
+
+# Recent successful logins, so a repeat login within the TTL skips the KDF.
+# Keys are sha256(username, password, stored hash): the raw password is never
+# kept, and a password change produces a new key.
+_AUTH_CACHE_TTL = 60
+_AUTH_CACHE_SIZE = 1024
+_auth_cache = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
+def _auth_cache_key(username, password, stored_hash):
+    h = hashlib.sha256()
+    for part in (username, password, stored_hash):
+        h.update(part if isinstance(part, (bytes, bytearray)) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.digest()
+
+def _auth_cache_get(key):
+    """Return the cached user id for a login key, or None if missing/expired."""
+    with _auth_cache_lock:
+        entry = _auth_cache.get(key)
+        if entry is None:
+            return None
+        user_id, expires = entry
+        if expires < time.monotonic():
+            del _auth_cache[key]
+            return None
+        return user_id
+
+def _auth_cache_put(key, user_id):
+    with _auth_cache_lock:
+        _auth_cache[key] = (user_id, time.monotonic() + _AUTH_CACHE_TTL)
+        _auth_cache.move_to_end(key)
+        while len(_auth_cache) > _AUTH_CACHE_SIZE:
+            _auth_cache.popitem(last=False)
+
+# --------------------------------------------------
+# JSON responses
+# --------------------------------------------------
+def json_response(payload):
+    """Like jsonify, but serialised with orjson when it is installed."""
+    body = orjson.dumps(payload) if _HAS_ORJSON else json.dumps(payload)
+    return app.response_class(body, mimetype='application/json')
+
 # --------------------------------------------------
 # Context processor for datetime
 # --------------------------------------------------
@@ -42,295 +270,288 @@ def inject_now():
 # Load ML models
 # --------------------------------------------------
 ML_DISEASES = ["diabetes", "kidney", "heart", "liver"]
+
+# Feature order per ML disease, fixed once so requests don't re-read MODEL_FEATURES
+FEATURE_KEYS = {disease: tuple(MODEL_FEATURES[disease]) for disease in ML_DISEASES}
+
 MODEL_COMPONENTS = {}
-for disease in ML_DISEASES:
-    try:
-        MODEL_COMPONENTS[disease] = {
-            "model": pickle.load(open(f"models/{disease}_model.pkl", "rb")),
-            "scaler": pickle.load(open(f"models/{disease}_scaler.pkl", "rb")),
-            "imputer": pickle.load(open(f"models/{disease}_imputer.pkl", "rb"))
-        }
-    except Exception:
-        pass
+_MODEL_LOCK = threading.Lock()
 
-# --------------------------------------------------
-# RULE-BASED LOGIC
-# --------------------------------------------------
-def thyroid_rule(inputs):
+def _load_pipeline(disease):
     """
-    Numerical-only Thyroid Risk Assessment
-
-    Inputs (all numbers):
-    - Age (years)
-    - Sex (0 = Male, 1 = Female)
-    - TSH (0.5 - 4.5 is normal)
-    - T3 (0.8 - 2.0 is normal)
-    - TT4 (4.5 - 12.0 is normal)
-    - On_Thyroxine (0 = No, 1 = Yes)
-
-    Returns:
-    - "Normal" or "Risky"
+    Load models/{disease}_pipeline.pkl, or assemble the same Pipeline from
+    the legacy model/scaler/imputer pickles if it hasn't been built yet.
     """
-    try:
-        age = float(inputs.get('Age', 0))
-        sex = int(inputs.get('Sex', -1))              # 0 or 1
-        tsh = float(inputs.get('TSH', 0))
-        t3 = float(inputs.get('T3', 0))
-        t4 = float(inputs.get('T4', 0))
-        thyroxine = int(inputs.get('Thyroxine', 0))
-    except:
-        return "Risky"
-
-    # Check age
-    if age <= 0 or age > 120:
-        return "Risky"
-
-    # Check sex
-    if sex not in [0, 1]:
-        return "Risky"
-
-    # On Thyroxine abnormal
-    if thyroxine not in [0, 1]:
-        return "Risky"
+    import joblib  # reads both joblib-compressed and plain pickle files
+    from sklearn.pipeline import Pipeline
 
-    # Lab ranges
-    if 0.5 <= tsh <= 4.5 and 0.8 <= t3 <= 2.0 and 4.5 <= t4 <= 12.0:
-        return "Normal"
+    pipeline_path = f"models/{disease}_pipeline.pkl"
+    if os.path.exists(pipeline_path):
+        pipeline = joblib.load(pipeline_path)
     else:
-        return "Risky"
+        model = joblib.load(f"models/{disease}_model.pkl")
+        scaler = joblib.load(f"models/{disease}_scaler.pkl")
+        imputer = joblib.load(f"models/{disease}_imputer.pkl")
+        pipeline = Pipeline([("imputer", imputer), ("scaler", scaler), ("model", model)])
+
+    # Legacy pickles were fitted on DataFrames; inputs arrive as ndarrays in
+    # FEATURE_KEYS order, so drop the column names sklearn would warn about
+    for step in pipeline.named_steps.values():
+        if hasattr(step, "feature_names_in_"):
+            del step.feature_names_in_
+    return pipeline
+
+def _get_components(disease):
+    """
+    Return the prediction components for a disease, loading them on
+    first use. Returns None if the model files cannot be loaded.
+    """
+    components = MODEL_COMPONENTS.get(disease)
+    if components is not None:
+        return components
 
+    with _MODEL_LOCK:
+        # Another thread may have loaded it while we waited
+        if disease not in MODEL_COMPONENTS:
+            try:
+                pipeline = _load_pipeline(disease)
+            except Exception:
+                return None
+            MODEL_COMPONENTS[disease] = {"pipeline": pipeline}
+    return MODEL_COMPONENTS[disease]
 
+def _safe_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
 
-def malaria_rule(inputs):
+def _ml_infer_batch(disease, X):
     """
-    Numerical-only Malaria Risk Assessment
-
-    Inputs (all numbers):
-    - Temperature (°F)
-    - Headache (1 = yes, 0 = no)
-    - Vomiting (1 = yes, 0 = no)
-    - Joint Pain (1 = yes, 0 = no)
-    - RBC count (million/µL)
-
-    Returns:
-    - "Normal" or "Risky"
+    Run the imputer -> scaler -> model pipeline on an (n_rows, n_features) array.
+    Returns (preds, probs) arrays of length n_rows.
     """
-    try:
-        temp = float(inputs.get('Temperature', 0))
-        headache = int(inputs.get('Headache', 0))
-        vomiting = int(inputs.get('Vomiting', 0))
-        joint_pain = int(inputs.get('Joint_Pain', 0))
-        rbc = float(inputs.get('rbc_count', 0))
-    except:
-        return "Risky"
+    import numpy as np  # deferred: only the ML branch needs it
 
-    # Check numerical ranges
-    if temp <= 0 or temp > 115:   # realistic human range
-        return "Risky"
-    if headache not in [0, 1] or vomiting not in [0, 1] or joint_pain not in [0, 1]:
-        return "Risky"
-    if rbc <= 0 or rbc > 1e6:      # realistic RBC count
-        return "Risky"
+    pipeline = _get_components(disease)['pipeline']
 
-    # Rule: Fever > 100°F with any symptom => Risky
-    if temp > 100 and (headache or vomiting or joint_pain):
-        return "Risky"
+    # One forward pass: derive the labels from the probabilities
+    proba = pipeline.predict_proba(X)
+    preds = pipeline.classes_[np.argmax(proba, axis=1)]
+    probs = proba[:, 1]
+    return preds, probs
 
-    # Moderate fever with symptoms can also be risky
-    if temp > 99 and (headache or vomiting or joint_pain):
-        return "Risky"
+_scratch = threading.local()
 
-    # Otherwise normal
-    return "Normal"
+def _get_scratch(n_features):
+    """Per-thread reusable (1, n_features) float64 input row."""
+    import numpy as np  # deferred: only the ML branch needs it
 
-def pneumonia_rule(inputs):
+    buffers = getattr(_scratch, "buffers", None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buf = buffers.get(n_features)
+    if buf is None:
+        buf = buffers[n_features] = np.empty((1, n_features), dtype=np.float64)
+    return buf
+
+@lru_cache(maxsize=2048)
+def _ml_infer(disease, feature_values):
     """
-    Pneumonia Risk Assessment:
-    Returns 'Normal' or 'Risky' based on multiple clinical parameters.
+    Single-row _ml_infer_batch, cached on the exact feature values so
+    repeated submissions skip sklearn. Returns (pred, prob).
     """
+    X = _get_scratch(len(feature_values))
+    X[0, :] = feature_values
+    preds, probs = _ml_infer_batch(disease, X)
+    return int(preds[0]), float(probs[0])
 
-    # Convert inputs safely
-    age = float(inputs.get('Age', 0))
-    cough = int(inputs.get('Cough', 0))           # severity 0-3
-    fever = float(inputs.get('Fever', 0))         # °C
-    wbc = float(inputs.get('WBC', 0))             # cells per µL
-    oxygen = float(inputs.get('Oxygen_Saturation', 0))  # %
+# --------------------------------------------------
+# RULE-BASED LOGIC
+# --------------------------------------------------
+# Every rule-based disease is a table of input fields and weighted rules.
+#   fields: (form key, default, cast) -- a failed cast or NaN means "Risky"
+#   rules:  (form key, op, value, weight) -- fires when `input op value`
+# The result is "Risky" once the weights of the fired rules reach `threshold`.
+RULE_TABLE = {
+    # Age (years), Sex (0 = Male, 1 = Female), TSH (0.5 - 4.5 normal),
+    # T3 (0.8 - 2.0 normal), T4 (4.5 - 12.0 normal), Thyroxine (0/1)
+    'thyroid': {
+        'fields': (
+            ('Age', 0, float),
+            ('Sex', -1, int),
+            ('TSH', 0, float),
+            ('T3', 0, float),
+            ('T4', 0, float),
+            ('Thyroxine', 0, int),
+        ),
+        'rules': (
+            ('Age', '<=', 0, 1), ('Age', '>', 120, 1),
+            ('Sex', '<', 0, 1), ('Sex', '>', 1, 1),
+            ('Thyroxine', '<', 0, 1), ('Thyroxine', '>', 1, 1),
+            ('TSH', '<', 0.5, 1), ('TSH', '>', 4.5, 1),
+            ('T3', '<', 0.8, 1), ('T3', '>', 2.0, 1),
+            ('T4', '<', 4.5, 1), ('T4', '>', 12.0, 1),
+        ),
+        'threshold': 1,
+    },
 
-    risk_factors = 0
+    # Temperature (°F), Headache / Vomiting / Joint_Pain (0/1),
+    # rbc_count (million/µL). Out-of-range values alone are Risky (weight 4);
+    # fever > 99°F (3) is Risky only together with any symptom (1 each).
+    'malaria': {
+        'fields': (
+            ('Temperature', 0, float),
+            ('Headache', 0, int),
+            ('Vomiting', 0, int),
+            ('Joint_Pain', 0, int),
+            ('rbc_count', 0, float),
+        ),
+        'rules': (
+            ('Temperature', '<=', 0, 4), ('Temperature', '>', 115, 4),
+            ('Headache', '<', 0, 4), ('Headache', '>', 1, 4),
+            ('Vomiting', '<', 0, 4), ('Vomiting', '>', 1, 4),
+            ('Joint_Pain', '<', 0, 4), ('Joint_Pain', '>', 1, 4),
+            ('rbc_count', '<=', 0, 4), ('rbc_count', '>', 1e6, 4),
+            ('Temperature', '>', 99, 3),
+            ('Headache', '==', 1, 1),
+            ('Vomiting', '==', 1, 1),
+            ('Joint_Pain', '==', 1, 1),
+        ),
+        'threshold': 4,
+    },
 
-    # Age risk
-    if age > 60:
-        risk_factors += 1
+    # Age, Cough (severity 0-3), Fever (°C), WBC (cells per µL),
+    # Oxygen_Saturation (%). Any risk factor is Risky.
+    'pneumonia': {
+        'fields': (
+            ('Age', 0, float),
+            ('Cough', 0, int),
+            ('Fever', 0, float),
+            ('WBC', 0, float),
+            ('Oxygen_Saturation', 0, float),
+        ),
+        'rules': (
+            ('Age', '>', 60, 1),
+            ('Cough', '>=', 2, 1),
+            ('Fever', '>', 38, 1),
+            ('WBC', '>', 11000, 1),
+            ('Oxygen_Saturation', '<', 92, 1),
+        ),
+        'threshold': 1,
+    },
 
-    # Cough severity
-    if cough >= 2:
-        risk_factors += 1
+    # Kidney normal ranges; any value outside them is Risky.
+    'kidney': {
+        'fields': (
+            ('sg', 0, float),
+            ('al', 0, float),
+            ('rbc', 0, float),
+            ('pc', 0, float),
+            ('hemo', 0, float),
+            ('wc', 0, float),
+            ('rc', 0, float),
+            ('bp', 0, float),
+        ),
+        'rules': (
+            ('sg', '<', 1.005, 1), ('sg', '>', 1.030, 1),
+            ('al', '>', 2, 1),
+            ('rbc', '<', 3.5, 1), ('rbc', '>', 5.5, 1),
+            ('pc', '<', 150, 1), ('pc', '>', 450, 1),
+            ('hemo', '<', 13.5, 1), ('hemo', '>', 17.5, 1),
+            ('wc', '<', 4000, 1), ('wc', '>', 11000, 1),
+            ('rc', '<', 4.2, 1), ('rc', '>', 5.4, 1),
+            ('bp', '<', 90, 1), ('bp', '>', 140, 1),
+        ),
+        'threshold': 1,
+    },
 
-    # Fever
-    if fever > 38:
-        risk_factors += 1
+    # Liver lab ranges (realistic); any value outside them is Risky.
+    'liver': {
+        'fields': (
+            ('Age', 0, float),
+            ('Total_Bilirubin', 0, float),
+            ('Direct_Bilirubin', 0, float),
+            ('Alkaline_Phosphotase', 0, float),
+            ('Alamine_Aminotransferase', 0, float),
+            ('Aspartate_Aminotransferase', 0, float),
+        ),
+        'rules': (
+            ('Age', '<=', 0, 1), ('Age', '>', 120, 1),
+            ('Total_Bilirubin', '<', 0.3, 1), ('Total_Bilirubin', '>', 1.2, 1),
+            ('Direct_Bilirubin', '<', 0.1, 1), ('Direct_Bilirubin', '>', 0.5, 1),
+            ('Alkaline_Phosphotase', '<', 30, 1), ('Alkaline_Phosphotase', '>', 120, 1),
+            ('Alamine_Aminotransferase', '<', 7, 1), ('Alamine_Aminotransferase', '>', 56, 1),
+            ('Aspartate_Aminotransferase', '<', 10, 1), ('Aspartate_Aminotransferase', '>', 40, 1),
+        ),
+        'threshold': 1,
+    },
 
-    # WBC count (leukocytosis)
-    if wbc > 11000:
-        risk_factors += 1
+    # age, sex (0/1), cp (chest pain type 0-3; 0 and 1 are higher risk),
+    # trestbps (resting BP), chol, thalach (max heart rate), exang (0/1).
+    # Cholesterol and BP add 0.5 per tier crossed.
+    'heart': {
+        'fields': (
+            ('age', 0, float),
+            ('sex', -1, int),
+            ('cp', -1, int),
+            ('trestbps', 0, float),
+            ('chol', 0, float),
+            ('thalach', 0, float),
+            ('exang', -1, int),
+        ),
+        'rules': (
+            ('age', '>', 55, 1),
+            ('chol', '>', 200, 0.5), ('chol', '>', 240, 0.5),
+            ('trestbps', '>', 130, 0.5), ('trestbps', '>', 140, 0.5),
+            ('thalach', '<', 100, 1),
+            ('exang', '==', 1, 2),
+            ('cp', '==', 0, 1), ('cp', '==', 1, 1),
+        ),
+        'threshold': 3,
+    },
+}
 
-    # Oxygen saturation
-    if oxygen < 92:
-        risk_factors += 1
+_RULE_OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt,
+             '>=': operator.ge, '==': operator.eq}
 
-    # If any risk factor exists, mark as Risky
-    if risk_factors > 0:
-        return "Risky"
+def _compile_rules(name):
+    """Turn a RULE_TABLE entry into (key, compare, value, weight) tuples."""
+    return tuple((key, _RULE_OPS[op], value, weight)
+                 for key, op, value, weight in RULE_TABLE[name]['rules'])
 
-    return "Normal"
+# Compiled once: a request only walks a handful of tuples, with no array
+# allocation or NumPy dispatch (which cost more than the compares for <20 rules)
+_COMPILED_RULES = {name: _compile_rules(name) for name in RULE_TABLE}
 
-def heart_rule(inputs):
+def _eval_rules(name, inputs):
     """
-    Heart Disease Risk Assessment
-    
-    Inputs:
-    - age (years)
-    - sex (0 = Male, 1 = Female)
-    - cp (chest pain type: 0-3)
-    - trestbps (resting blood pressure)
-    - chol (cholesterol)
-    - thalach (max heart rate achieved)
-    - exang (exercise induced angina: 0 = No, 1 = Yes)
-    
-    Returns: "Normal" or "Risky"
+    Evaluate the RULE_TABLE entry for a disease against form inputs.
+    Returns "Normal" or "Risky".
     """
+    table = RULE_TABLE[name]
     try:
-        age = float(inputs.get('age', 0))
-        sex = int(inputs.get('sex', -1))
-        cp = int(inputs.get('cp', -1))
-        trestbps = float(inputs.get('trestbps', 0))
-        chol = float(inputs.get('chol', 0))
-        thalach = float(inputs.get('thalach', 0))
-        exang = int(inputs.get('exang', -1))
+        parsed = {key: cast(inputs.get(key, default)) for key, default, cast in table['fields']}
     except:
         return "Risky"
-    
-    risk_factors = 0
-    
-    # Age risk (higher risk for older patients)
-    if age > 55:
-        risk_factors += 1
-    
-    # High cholesterol
-    if chol > 240:
-        risk_factors += 1
-    elif chol > 200:
-        risk_factors += 0.5
-    
-    # High blood pressure
-    if trestbps > 140:
-        risk_factors += 1
-    elif trestbps > 130:
-        risk_factors += 0.5
-    
-    # Low max heart rate (indicates poor cardiac fitness)
-    if thalach < 100:
-        risk_factors += 1
-    
-    # Exercise induced angina (chest pain with exercise)
-    if exang == 1:
-        risk_factors += 2
-    
-    # Chest pain type (type 0 is typical angina, higher risk)
-    if cp == 0 or cp == 1:
-        risk_factors += 1
-    
-    # Risk assessment
-    if risk_factors >= 3:
-        return "Risky"
-    else:
-        return "Normal"
-
-def kidney_rule(inputs):
-    try:
-        sg = float(inputs.get('sg', 0))
-        al = float(inputs.get('al', 0))
-        rbc = float(inputs.get('rbc', 0))
-        pc = float(inputs.get('pc', 0))
-        hemo = float(inputs.get('hemo', 0))
-        wc = float(inputs.get('wc', 0))
-        rc = float(inputs.get('rc', 0))
-        bp = float(inputs.get('bp', 0))
-    except:
-        return "Risky"
-
-    if sg < 1.005 or sg > 1.030:
-        return "Risky"
-    if al > 2:
-        return "Risky"
-    if rbc < 3.5 or rbc > 5.5:
-        return "Risky"
-    if pc < 150 or pc > 450:
-        return "Risky"
-    if hemo < 13.5 or hemo > 17.5:
-        return "Risky"
-    if wc < 4000 or wc > 11000:
-        return "Risky"
-    if rc < 4.2 or rc > 5.4:
-        return "Risky"
-    if bp < 90 or bp > 140:
-        return "Risky"
-    return "Normal"
-def liver_rule(inputs):
-    """
-    Liver Risk Assessment (Rule-Based)
-
-    Accepts keys:
-    - 'Age'
-    - 'Total Bilirubin'
-    - 'Direct Bilirubin'
-    - 'Alkaline Phosphotase'
-    - 'Alamine Aminotransferase'
-    - 'Aspartate Aminotransferase'
-    - 'Total Proteins' (optional)
-    - 'Albumin' (optional)
-
-    Returns "Normal" or "Risky"
-    """
-    try:
-        age = float(str(inputs.get('Age', 0)).strip())
-        tb = float(str(inputs.get('Total_Bilirubin', 0)).strip())
-        db = float(str(inputs.get('Direct_Bilirubin', 0)).strip())
-        alkphos = float(str(inputs.get('Alkaline_Phosphotase', 0)).strip())
-        sgpt = float(str(inputs.get('Alamine_Aminotransferase', 0)).strip())
-        sgot = float(str(inputs.get('Aspartate_Aminotransferase', 0)).strip())
-         # default normal
-    except Exception:
-        return "Risky"
 
-    # Age check
-    if age <= 0 or age > 120:
-        return "Risky"
+    score = 0
+    for key, compare, value, weight in _COMPILED_RULES[name]:
+        x = parsed[key]
+        if x != x:  # NaN
+            return "Risky"
+        if compare(x, value):
+            score += weight
+    return "Risky" if score >= table['threshold'] else "Normal"
 
-    # Liver lab ranges (realistic)
-    if not (0.3 <= tb <= 1.2):
-        return "Risky"
-    if not (0.1 <= db <= 0.5):
-        return "Risky"
-    if not (30 <= alkphos <= 120):
-        return "Risky"
-    if not (7 <= sgpt <= 56):
-        return "Risky"
-    if not (10 <= sgot <= 40):
-        return "Risky"
 
-    return "Normal"
+RULE_BASED = {name: partial(_eval_rules, name) for name in RULE_TABLE}
 
+@lru_cache(maxsize=2048)
+def _rule_infer(disease, input_items):
+    """Cached wrapper around RULE_BASED keyed on the submitted form items."""
+    return RULE_BASED[disease](dict(input_items))
 
-
-RULE_BASED = {
-    'thyroid': thyroid_rule,
-    'malaria': malaria_rule,
-    'pneumonia': pneumonia_rule,
-    'kidney': kidney_rule,
-    'liver': liver_rule,
-    'heart': heart_rule
-}
 RECOMMENDATIONS = {
     'diabetes': {
         'Normal': "Keep a balanced diet and exercise regularly to maintain healthy blood sugar levels.",
@@ -555,6 +776,53 @@ SUGGESTIONS = {
 
 }
 
+def _html_list_items(items):
+    """Render escaped <li> elements with a single join."""
+    if not items:
+        return ''
+    return '<li>' + '</li><li>'.join(map(escape, items)) + '</li>'
+
+def _build_result_html(disease_name, result):
+    """Render the result + recommendation cards for one (disease, result) pair."""
+    suggestion_block = SUGGESTIONS.get(disease_name, {}).get(result, {})
+    clinical = suggestion_block.get('clinical', [])
+    herbal = suggestion_block.get('herbal', [])
+
+    html = f"""
+    <div class="result-box {'normal-box' if result=='Normal' else 'risk-box'}">
+        <h3>{disease_name.title()} Prediction</h3>
+        <p class="result-text">{result}</p>
+    </div>
+
+    <div class="recommendation-grid">
+        <div class="recommendation-card clinical-card">
+            <h4>Clinical Recommendations</h4>
+            <ul>
+                {_html_list_items(clinical)}
+            </ul>
+        </div>
+
+        <div class="recommendation-card herbal-card">
+            <h4>Herbal & Lifestyle Support</h4>
+            <ul>
+                {_html_list_items(herbal)}
+            </ul>
+        </div>
+    </div>
+
+    <p class="disclaimer">
+        Herbal suggestions are supportive only and do not replace medical treatment.
+    </p>
+    """
+    return html
+
+# The output only depends on (disease, result), so render every pair once
+RESULT_HTML = {
+    (disease_name, result): _build_result_html(disease_name, result)
+    for disease_name in SUGGESTIONS
+    for result in ("Normal", "Risky")
+}
+
 
 # --------------------------------------------------
 # Routes
@@ -596,14 +864,13 @@ def signup():
         if not username or not password or not email:
             return render_template('signup.html', error="All fields are required.")
 
-        # Hash password securely using pbkdf2:sha256
-        password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        # Hash password securely (argon2, or pbkdf2:sha256 as fallback)
+        password_hash = hash_password(password)
 
         conn = get_db_connection()
         # Check if username already exists
         existing = conn.execute("SELECT * FROM users WHERE username=?", (username,)).fetchone()
         if existing:
-            conn.close()
             return render_template('signup.html', error="Username already exists. Choose another.")
         
         conn.execute(
@@ -611,7 +878,6 @@ def signup():
             (username, email, password_hash)
         )
         conn.commit()
-        conn.close()
         return redirect(url_for('login'))
     return render_template('signup.html')
 
@@ -625,7 +891,6 @@ def login():
 
         conn = get_db_connection()
         user = conn.execute("SELECT * FROM users WHERE username=?", (username,)).fetchone()
-        conn.close()
 
         if not user:
             return render_template('login.html', error="Invalid username or password")
@@ -644,7 +909,14 @@ def login():
                 # keep as bytes for bcrypt
                 pass
 
-        # Detect bcrypt-style hashes (they start with $2a/$2b/$2y)
+        # Recently verified with the same password: skip the slow hash check
+        cache_key = _auth_cache_key(username, password or '', stored_hash)
+        if _auth_cache_get(cache_key) == user['id']:
+            session['user_id'] = user['id']
+            session['username'] = username
+            return redirect(url_for('dashboard'))
+
+        # Detect bcrypt-style hashes (they start with $2a/$2b/$2y) and argon2 ($argon2id)
         try:
             is_bcrypt = False
             if isinstance(stored_hash, (bytes, bytearray)):
@@ -652,13 +924,29 @@ def login():
             elif isinstance(stored_hash, str):
                 is_bcrypt = stored_hash.startswith('$2')
 
-            if is_bcrypt:
+            is_argon2 = isinstance(stored_hash, str) and stored_hash.startswith('$argon2')
+
+            if is_argon2:
+                if not _HAS_ARGON2:
+                    return render_template('login.html', error='Server misconfiguration: argon2 not available')
+                try:
+                    _argon2.verify(stored_hash, password)
+                except InvalidHashError:
+                    return render_template('login.html', error='Stored password hash is invalid')
+                except VerificationError:
+                    return render_template('login.html', error='Invalid username or password')
+                session['user_id'] = user['id']
+                session['username'] = username
+                _auth_cache_put(cache_key, user['id'])
+                return redirect(url_for('dashboard'))
+            elif is_bcrypt:
                 if not _HAS_BCRYPT:
                     return render_template('login.html', error='Server misconfiguration: bcrypt not available')
                 hash_bytes = stored_hash if isinstance(stored_hash, (bytes, bytearray)) else stored_hash.encode('utf-8')
                 if bcrypt.checkpw(password.encode('utf-8'), hash_bytes):
                     session['user_id'] = user['id']
                     session['username'] = username
+                    _auth_cache_put(cache_key, user['id'])
                     return redirect(url_for('dashboard'))
                 else:
                     return render_template('login.html', error='Invalid username or password')
@@ -667,6 +955,7 @@ def login():
                 if check_password_hash(stored_hash, password):
                     session['user_id'] = user['id']
                     session['username'] = username
+                    _auth_cache_put(cache_key, user['id'])
                     return redirect(url_for('dashboard'))
         except ValueError:
             # Raised by werkzeug if stored hash is malformed
@@ -689,7 +978,6 @@ def dashboard():
     history = conn.execute(
         "SELECT * FROM predictions WHERE user_id=? ORDER BY timestamp DESC", (user_id,)
     ).fetchall()
-    conn.close()
     return render_template('dashboard.html', history=history)
 
 @app.route('/logout')
@@ -706,119 +994,75 @@ def predict(disease_name):
 
     # ---------- RULE BASED ----------
     if disease_name in RULE_BASED:
-        result = RULE_BASED[disease_name](inputs)
+        result = _rule_infer(disease_name, tuple(sorted(inputs.items())))
 
     # ---------- ML BASED ----------
     elif disease_name in ML_DISEASES:
-        components = MODEL_COMPONENTS.get(disease_name)
+        components = _get_components(disease_name)
         if not components:
-            return jsonify({'status': 'error', 'error': f'Model for {disease_name} not found.'})
-
-        features = MODEL_FEATURES[disease_name]
-        X_dict = {}
-
-        for f in features:
-            try:
-                X_dict[f] = [float(inputs.get(f, 0))]
-            except:
-                X_dict[f] = [0.0]
-
-        X_df = pd.DataFrame(X_dict)
-        X_imputed = components['imputer'].transform(X_df)
-        X_scaled = components['scaler'].transform(X_imputed)
-
-        pred = components['model'].predict(X_scaled)[0]
-        prob = components['model'].predict_proba(X_scaled)[0][1]
-
-        # ---------- STEP 4: MEDICAL SANITY LOGIC (KIDNEY ONLY) ----------
-   
-        if disease_name == 'kidney':
-            try:
-                sg = float(inputs.get('sg', 0))
-                al = float(inputs.get('al', 0))
-                rbc = float(inputs.get('rbc', 0))
-                pc = float(inputs.get('pc', 0))
-                hemo = float(inputs.get('hemo', 0))
-                wc = float(inputs.get('wc', 0))
-                rc = float(inputs.get('rc', 0))
-                bp = float(inputs.get('bp', 0))
-            except:
-                result = "Risky"
-            else:
-                # Kidney normal ranges
-                if sg < 1.005 or sg > 1.030:
-                    result = "Risky"
-                elif al > 2:
-                    result = "Risky"
-                elif rbc < 3.5 or rbc > 5.5:
-                    result = "Risky"
-                elif pc < 150 or pc > 450:
-                    result = "Risky"
-                elif hemo < 13.5 or hemo > 17.5:
-                    result = "Risky"
-                elif wc < 4000 or wc > 11000:
-                    result = "Risky"
-                elif rc < 4.2 or rc > 5.4:
-                    result = "Risky"
-                elif bp < 90 or bp > 140:
-                    result = "Risky"
-                else:
-                    result = "Normal"
-        else:
-            result = "Normal" if pred == 0 else "Risky"
+            return json_response({'status': 'error', 'error': f'Model for {disease_name} not found.'})
 
+        feature_values = tuple(_safe_float(inputs.get(f, 0)) for f in FEATURE_KEYS[disease_name])
+        pred, prob = _ml_infer(disease_name, feature_values)
+        result = "Normal" if pred == 0 else "Risky"
 
     else:
-        return jsonify({'status': 'error', 'error': 'Disease not recognized.'})
-
-    # ---------- SUGGESTIONS ----------
-    suggestion_block = SUGGESTIONS.get(disease_name, {}).get(result, {})
-    clinical = suggestion_block.get('clinical', [])
-    herbal = suggestion_block.get('herbal', [])
+        return json_response({'status': 'error', 'error': 'Disease not recognized.'})
 
     # ---------- SAVE PREDICTION ----------
     user_id = session.get('user_id')
     if user_id:
-        conn = get_db_connection()
-        conn.execute(
-            "INSERT INTO predictions (user_id, disease, input_data, result) VALUES (?, ?, ?, ?)",
-            (user_id, disease_name, str(inputs), result)
-        )
-        conn.commit()
-        conn.close()
+        save_prediction(user_id, disease_name, inputs, result)
 
     # ---------- STYLED HTML OUTPUT ----------
-    html = f"""
-    <div class="result-box {'normal-box' if result=='Normal' else 'risk-box'}">
-        <h3>{disease_name.title()} Prediction</h3>
-        <p class="result-text">{result}</p>
-    </div>
+    html = RESULT_HTML[(disease_name, result)]
 
-    <div class="recommendation-grid">
-        <div class="recommendation-card clinical-card">
-            <h4>Clinical Recommendations</h4>
-            <ul>
-                {''.join(f"<li>{c}</li>" for c in clinical)}
-            </ul>
-        </div>
+    return json_response({'status': 'success', 'html': html})
 
-        <div class="recommendation-card herbal-card">
-            <h4>Herbal & Lifestyle Support</h4>
-            <ul>
-                {''.join(f"<li>{h}</li>" for h in herbal)}
-            </ul>
-        </div>
-    </div>
 
-    <p class="disclaimer">
-        Herbal suggestions are supportive only and do not replace medical treatment.
-    </p>
+
+
+
+# --------------------------------------------------
+# Batch prediction route
+# --------------------------------------------------
+@app.route('/predict_batch/<disease_name>', methods=['POST'])
+def predict_batch(disease_name):
     """
+    Predict many rows at once. Expects JSON {"rows": [{feature: value}, ...]}
+    and returns {"status": "success", "results": ["Normal" | "Risky", ...]}.
+    ML diseases run through the model once for all rows.
+    """
+    payload = request.get_json(silent=True)
+    rows = payload.get('rows') if isinstance(payload, dict) else None
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        return json_response({'status': 'error', 'error': 'Expected JSON body {"rows": [...]}.'})
 
-    return jsonify({'status': 'success', 'html': html})
+    # ---------- RULE BASED ----------
+    if disease_name in RULE_BASED:
+        results = [RULE_BASED[disease_name](row) for row in rows]
 
+    # ---------- ML BASED ----------
+    elif disease_name in ML_DISEASES:
+        if not _get_components(disease_name):
+            return json_response({'status': 'error', 'error': f'Model for {disease_name} not found.'})
+        if not rows:
+            return json_response({'status': 'success', 'results': []})
+
+        import numpy as np  # deferred: only the ML branch needs it
 
+        features = FEATURE_KEYS[disease_name]
+        X = np.empty((len(rows), len(features)), dtype=np.float64)
+        for j, f in enumerate(features):
+            X[:, j] = [_safe_float(row.get(f, 0)) for row in rows]
+
+        preds, _ = _ml_infer_batch(disease_name, X)
+        results = ["Normal" if pred == 0 else "Risky" for pred in preds]
+
+    else:
+        return json_response({'status': 'error', 'error': 'Disease not recognized.'})
 
+    return json_response({'status': 'success', 'results': results})
 
 
 # --------------------------------------------------
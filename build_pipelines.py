@@ -0,0 +1,22 @@
+import os
+import joblib
+from ml_pipeline import save_pipeline
+
+# Wraps already-trained model/scaler/imputer pickles into a single
+# models/{disease}_pipeline.pkl without retraining. The bundles are build
+# output (not committed); only the model-based diseases are ever loaded.
+MODEL_DIR = "models"
+
+ML_DISEASES = ("diabetes", "heart", "liver", "kidney")
+
+for disease in ML_DISEASES:
+    try:
+        print(f"Building pipeline for {disease}...")
+        components = {}
+        for part in ("model", "scaler", "imputer"):
+            components[part] = joblib.load(os.path.join(MODEL_DIR, f"{disease}_{part}.pkl"))
+
+        save_pipeline(disease, components["imputer"], components["scaler"], components["model"], MODEL_DIR)
+        print(f"Pipeline for {disease} saved to: {MODEL_DIR}/{disease}_pipeline.pkl")
+    except Exception as e:
+        print(f"[Error] Failed to build pipeline for {disease}: {e}")
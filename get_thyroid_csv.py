@@ -27,10 +27,17 @@ datasets = {
 
 for name, info in datasets.items():
     try:
+        csv_path = f"data/{name}_simple.csv"
+
+        # Skip datasets whose simplified copy is newer than the source
+        if os.path.exists(csv_path) and os.path.getmtime(csv_path) >= os.path.getmtime(info['url']):
+            print(f"{name} dataset up-to-date, skipping")
+            continue
+
         print(f"Processing {name} dataset...")
-        df = pd.read_csv(info['url'])
+        # Only parse the columns we keep
+        df = pd.read_csv(info['url'], usecols=info['columns'])
         simple_df = df[info['columns']]
-        csv_path = f"data/{name}_simple.csv"
         simple_df.to_csv(csv_path, index=False)
         print(f"Simplified {name} dataset saved to: {csv_path}")
     except Exception as e:
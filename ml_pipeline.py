@@ -1,12 +1,16 @@
 from datetime import datetime
-import pandas as pd
 import numpy as np
 import pickle
 import os
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-from sklearn.metrics import accuracy_score, roc_auc_score, f1_score
+import json
+import hashlib
+import zlib
+
+# pandas, sklearn and the optional exporters are imported inside the
+# functions that use them: app.py imports MODEL_FEATURES from this module
+# and shouldn't pay seconds of import time for training-only code.
+
+KIDNEY_CSV = "data/kidney_simple.csv"
 
 # --- Define Features for all 7 Diseases ---
 MODEL_FEATURES = {
@@ -77,12 +81,153 @@ MODEL_FEATURES = {
 }
 
 
+def save_component(obj, path):
+    """
+    Saves a fitted estimator with joblib: compressed, highest pickle protocol.
+    zlib level 3 by default; USE_LZ4=1 switches to LZ4, which loads faster
+    but can then only be loaded where lz4 is installed. Files keep their
+    .pkl names; joblib.load also reads older plain pickles.
+    """
+    import joblib
+
+    compress = 3
+    if os.environ.get("USE_LZ4") == "1":
+        try:
+            import lz4  # noqa: F401
+            compress = ("lz4", 3)
+        except ImportError:
+            print("[Warning] USE_LZ4=1 but lz4 is not installed, using zlib")
+
+    joblib.dump(obj, path, compress=compress, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def save_treelite_lib(disease_name, model, model_dir="models"):
+    """
+    Compiles the fitted tree model into a native {disease}_model.so with
+    treelite + tl2cgen (needs gcc). Skipped when they aren't installed.
+    """
+    # A library from a previous run would shadow the new .pkl model in
+    # prediction_service, so drop it before anything can bail out
+    lib_path = os.path.join(model_dir, f"{disease_name}_model.so")
+    if os.path.exists(lib_path):
+        os.remove(lib_path)
+
+    try:
+        import treelite
+        import tl2cgen
+    except Exception:
+        return
+
+    try:
+        tl_model = treelite.sklearn.import_model(model)
+        tl2cgen.export_lib(
+            tl_model,
+            toolchain="gcc",
+            libpath=lib_path,
+            params={"parallel_comp": os.cpu_count() or 1},
+            verbose=False
+        )
+    except Exception as e:
+        # Don't leave a partially built library behind
+        if os.path.exists(lib_path):
+            os.remove(lib_path)
+        reason = str(e).splitlines()[0] if str(e) else ""
+        print(f"[Warning] Treelite compilation failed for {disease_name}: {type(e).__name__}: {reason}")
+
+
+def save_pipeline(disease_name, imputer, scaler, model, model_dir="models"):
+    """
+    Saves imputer -> scaler -> model as one fitted sklearn Pipeline,
+    so prediction is a single predict_proba call. A None imputer or
+    scaler is kept as a passthrough step.
+    """
+    from sklearn.pipeline import Pipeline
+
+    pipeline = Pipeline([
+        ("imputer", imputer),
+        ("scaler", scaler),
+        ("model", model)
+    ])
+    save_component(pipeline, os.path.join(model_dir, f"{disease_name}_pipeline.pkl"))
+
+
+def use_sklearnex():
+    """
+    With USE_SKLEARNEX=1, patches sklearn with scikit-learn-intelex (oneDAL)
+    before any estimator is imported. Called per model, so each training
+    worker patches itself. Returns whether the patch is active.
+    """
+    if os.environ.get("USE_SKLEARNEX") != "1":
+        return False
+    try:
+        from sklearnex import patch_sklearn, sklearn_is_patched
+    except ImportError:
+        print("[Warning] USE_SKLEARNEX=1 but scikit-learn-intelex is not installed")
+        return False
+    if not sklearn_is_patched():
+        patch_sklearn(verbose=False)
+    return True
+
+
+def training_meta(disease_name, features, seed):
+    """
+    Everything that determines a trained model: if this matches the saved
+    {disease}_meta.json, retraining would reproduce the same files.
+    """
+    import sklearn
+    from importlib.util import find_spec
+
+    with open(__file__, "rb") as f:
+        code_hash = hashlib.sha256(f.read()).hexdigest()
+
+    meta = {
+        "seed": seed,
+        "features": list(features),
+        "sklearn_version": sklearn.__version__,
+        "code_sha256": code_hash,
+        # Optional outputs and switches: a change must trigger a rebuild
+        "treelite": find_spec("treelite") is not None and find_spec("tl2cgen") is not None,
+        "use_sklearnex": os.environ.get("USE_SKLEARNEX") == "1",
+        "use_lz4": os.environ.get("USE_LZ4") == "1"
+    }
+    if disease_name == "kidney" and os.path.exists(KIDNEY_CSV):
+        with open(KIDNEY_CSV, "rb") as f:
+            meta["data_sha256"] = hashlib.sha256(f.read()).hexdigest()
+    return meta
+
+
+def is_up_to_date(disease_name, meta, model_dir="models"):
+    meta_path = os.path.join(model_dir, f"{disease_name}_meta.json")
+    outputs = [
+        meta_path,
+        os.path.join(model_dir, f"{disease_name}_model.pkl"),
+        os.path.join(model_dir, f"{disease_name}_pipeline.pkl")
+    ]
+    if not all(os.path.exists(p) for p in outputs):
+        return False
+    with open(meta_path) as f:
+        return json.load(f) == meta
+
+
 def create_and_save_reliable_model(disease_name, features):
     """
     Creates ML models.
     - Uses REAL CSV for kidney
     - Uses simulated data for others
+    - Skips training when {disease}_meta.json shows nothing changed
     """
+    model_dir = "models"
+    seed = 42 + zlib.crc32(disease_name.encode())
+    meta = training_meta(disease_name, features, seed)
+    if is_up_to_date(disease_name, meta, model_dir):
+        print(f"Model for {disease_name} is up-to-date, skipping.")
+        return
+
+    # Patch first: the imports below must pick up any sklearnex replacements
+    use_sklearnex()
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    from sklearn.impute import SimpleImputer
+    from sklearn.metrics import accuracy_score, roc_auc_score, f1_score
 
     print(f"Creating model for {disease_name}...")
 
@@ -90,120 +235,159 @@ def create_and_save_reliable_model(disease_name, features):
     # ✅ STEP 3 FIX — REAL KIDNEY CSV TRAINING
     # ============================================================
     if disease_name == "kidney":
-        csv_path = "data/kidney_simple.csv"
+        csv_path = KIDNEY_CSV
 
         if not os.path.exists(csv_path):
             raise FileNotFoundError("kidney_simple.csv not found in data/ folder")
 
-        df = pd.read_csv(csv_path)
-        X = df[features]
-        y = df["classification"]
+        columns = features + ["classification"]
+        try:
+            import pyarrow.csv as pa_csv
+        except Exception:
+            pa_csv = None
+
+        if pa_csv is not None:
+            # Column projection happens inside the multi-threaded parser
+            table = pa_csv.read_csv(
+                csv_path,
+                convert_options=pa_csv.ConvertOptions(include_columns=columns)
+            )
+            X = np.column_stack([table[c].to_numpy(zero_copy_only=False) for c in features]).astype(np.float64)
+            y = table["classification"].to_numpy(zero_copy_only=False)
+        else:
+            import pandas as pd
+
+            df = pd.read_csv(csv_path, usecols=columns)
+            X = df[features].to_numpy(dtype=np.float64)
+            y = df["classification"].to_numpy()
 
     # ============================================================
     # SIMULATED DATA FOR OTHER DISEASES (UNCHANGED LOGIC)
     # ============================================================
     else:
         n_samples = 1000
-        np.random.seed(42 + hash(disease_name) % 100)
+        rng = np.random.default_rng(seed)
 
-        data = {}
-        for feature in features:
+        # One float32 matrix, filled a column at a time
+        X = np.empty((n_samples, len(features)), dtype=np.float32)
+        for i, feature in enumerate(features):
             if 'Age' in feature or 'age' in feature:
-                data[feature] = np.random.randint(20, 70, n_samples)
+                X[:, i] = rng.integers(20, 70, n_samples)
             elif 'Glucose' in feature:
-                data[feature] = np.random.randint(70, 200, n_samples)
+                X[:, i] = rng.integers(70, 200, n_samples)
             elif 'BMI' in feature:
-                data[feature] = np.random.uniform(18.5, 40, n_samples)
+                X[:, i] = rng.uniform(18.5, 40, n_samples)
             elif 'TSH' in feature:
-                data[feature] = np.random.uniform(0.5, 15.0, n_samples)
+                X[:, i] = rng.uniform(0.5, 15.0, n_samples)
             else:
-                data[feature] = np.random.rand(n_samples) * 100
-
-        df = pd.DataFrame(data)
+                X[:, i] = rng.uniform(0, 100, n_samples)
 
-        target_score = 0.0
+        col = {feature: X[:, i] for i, feature in enumerate(features)}
 
-        if disease_name == 'diabetes' and 'Glucose' in features:
-            target_score = (df['Glucose'] / 200) * 0.4 + (df.get('BMI', 0) / 40) * 0.3
+        if disease_name == 'diabetes' and 'Glucose' in col:
+            target_score = (col['Glucose'] / 200) * 0.4 + (col.get('BMI', 0) / 40) * 0.3
 
-        elif disease_name == 'heart' and 'chol' in features:
-            target_score = (df['chol'] / 300) * 0.4 + (df.get('age', 0) / 100) * 0.3
+        elif disease_name == 'heart' and 'chol' in col:
+            target_score = (col['chol'] / 300) * 0.4 + (col.get('age', 0) / 100) * 0.3
 
-        elif disease_name == 'liver' and 'Total_Bilirubin' in features:
-            target_score = (df['Total_Bilirubin'] / df['Total_Bilirubin'].max()) * 0.6
+        elif disease_name == 'liver' and 'Total_Bilirubin' in col:
+            target_score = (col['Total_Bilirubin'] / col['Total_Bilirubin'].max()) * 0.6
 
-        elif disease_name == 'thyroid' and 'TSH' in features:
-            target_score = (df['TSH'] / df['TSH'].max()) * 0.5
+        elif disease_name == 'thyroid' and 'TSH' in col:
+            target_score = (col['TSH'] / col['TSH'].max()) * 0.5
 
         else:
-            feat1 = features[0]
-            feat2 = features[1]
-            target_score = (df[feat1] / df[feat1].max()) * 0.3 + (df[feat2] / df[feat2].max()) * 0.3
+            feat1 = col[features[0]]
+            feat2 = col[features[1]]
+            target_score = (feat1 / feat1.max()) * 0.3 + (feat2 / feat2.max()) * 0.3
 
-        target_prob = np.clip(target_score + np.random.normal(0, 0.15, n_samples), 0, 1)
-        df['Outcome'] = (target_prob > 0.5).astype(int)
+        target_prob = np.clip(target_score + rng.normal(0, 0.15, n_samples), 0, 1)
+        y = (target_prob > 0.5).astype(np.int8)
 
-        if df['Outcome'].nunique() < 2:
-            df.loc[df.index[:10], 'Outcome'] = 1
-            df.loc[df.index[-10:], 'Outcome'] = 0
-
-        X = df[features]
-        y = df['Outcome']
+        if np.unique(y).size < 2:
+            y[:10] = 1
+            y[-10:] = 0
 
     # ============================================================
     # PREPROCESSING
     # ============================================================
-    imputer = SimpleImputer(strategy='mean')
-    X_imputed = imputer.fit_transform(X)
+    # Simulated data has no gaps; only fit an imputer when something is missing.
+    # None is still saved as the imputer to keep the file layout.
+    if np.isnan(X).any():
+        imputer = SimpleImputer(strategy='mean')
+        X_imputed = imputer.fit_transform(X)
+    else:
+        imputer = None
+        X_imputed = X
 
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X_imputed)
+    # Gradient boosting bins features itself, so no scaling is needed.
+    # None is still saved as the scaler to keep the file layout.
+    scaler = None
 
     # ============================================================
     # MODEL TRAINING
     # ============================================================
-    model = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=12,
+    # ~1000 rows x 5-8 features: shallow trees are enough, and early stopping
+    # ends boosting once the held-out loss stops improving for 10 rounds.
+    # HGB quantile-bins every feature into uint8 codes (max_bins=255) before
+    # fitting, so no separate discretizer step is needed in front of it.
+    model = HistGradientBoostingClassifier(
+        max_iter=200,
+        max_depth=6,
+        max_bins=255,
+        learning_rate=0.05,
+        early_stopping=True,
+        validation_fraction=0.1,
+        n_iter_no_change=10,
         random_state=42,
         class_weight='balanced'
     )
-    model.fit(X_scaled, y)
+    model.fit(X_imputed, y)
 
     # ============================================================
     # SAFE EVALUATION
     # ============================================================
-    y_pred = model.predict(X_scaled)
-    y_prob = model.predict_proba(X_scaled)[:, 1]
+    # One pass over the trees; labels are 0/1, so thresholding the
+    # positive-class probability gives what model.predict would
+    y_prob = model.predict_proba(X_imputed)[:, 1]
+    y_pred = (y_prob >= 0.5).astype(np.int8)
 
     accuracy = accuracy_score(y, y_pred)
     f1 = f1_score(y, y_pred)
     auc = roc_auc_score(y, y_prob)
 
-    print(f"  > Metrics: Acc={accuracy:.3f}, F1={f1:.3f}, AUC={auc:.3f}")
+    print(f"  > Metrics: Acc={accuracy:.3f}, F1={f1:.3f}, AUC={auc:.3f}, Iterations={model.n_iter_}")
 
     # ============================================================
     # SAVE MODEL FILES
     # ============================================================
-    model_dir = "models"
     os.makedirs(model_dir, exist_ok=True)
 
-    with open(os.path.join(model_dir, f"{disease_name}_model.pkl"), "wb") as f:
-        pickle.dump(model, f)
+    save_component(model, os.path.join(model_dir, f"{disease_name}_model.pkl"))
+    save_component(scaler, os.path.join(model_dir, f"{disease_name}_scaler.pkl"))
+    save_component(imputer, os.path.join(model_dir, f"{disease_name}_imputer.pkl"))
 
-    with open(os.path.join(model_dir, f"{disease_name}_scaler.pkl"), "wb") as f:
-        pickle.dump(scaler, f)
+    save_pipeline(disease_name, imputer, scaler, model, model_dir)
+    save_treelite_lib(disease_name, model, model_dir)
 
-    with open(os.path.join(model_dir, f"{disease_name}_imputer.pkl"), "wb") as f:
-        pickle.dump(imputer, f)
+    # Written last, so an interrupted run is retrained next time
+    with open(os.path.join(model_dir, f"{disease_name}_meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
 
     print(f"Successfully created and saved components for {disease_name}.")
 
 
 if __name__ == "__main__":
-
-    for disease, features in MODEL_FEATURES.items():
-        create_and_save_reliable_model(disease, features)
+    from joblib import Parallel, delayed
+
+    # Models are independent, so train them in parallel processes.
+    # ML_PIPELINE_JOBS sets the worker count (default: all cores); loky caps
+    # each worker's OpenMP threads so the pool is not oversubscribed.
+    n_jobs = int(os.environ.get("ML_PIPELINE_JOBS", "-1"))
+    Parallel(n_jobs=n_jobs, backend="loky")(
+        delayed(create_and_save_reliable_model)(disease, features)
+        for disease, features in MODEL_FEATURES.items()
+    )
 
     with open("models/model_features.pkl", "wb") as f:
         pickle.dump(MODEL_FEATURES, f)
@@ -0,0 +1,30 @@
+import numpy as np
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except Exception:
+    njit = None
+    _HAS_NUMBA = False
+
+
+def jit(func):
+    """
+    Compiles a scalar rule kernel with numba.njit(cache=True) when numba is
+    installed; otherwise returns the plain Python function unchanged.
+    """
+    if _HAS_NUMBA:
+        return njit(cache=True)(func)
+    return func
+
+
+def numeric_column(df, name, default):
+    """
+    Returns df[name] as a float64 array; unparseable values become NaN.
+    A missing column is filled with `default`.
+    """
+    import pandas as pd  # deferred: only the *_vec batch helpers need it
+
+    if name in df:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+    return np.full(len(df), default, dtype=np.float64)
@@ -1,3 +1,31 @@
+import numpy as np
+
+from rule_based.common import jit, numeric_column
+
+
+@jit
+def _malaria_core(temp, headache, vomiting, joint_pain, rbc):
+    """Returns True when the parsed inputs are Risky."""
+    # Check numerical ranges
+    if temp <= 0 or temp > 115:
+        return True
+    if headache != 0 and headache != 1:
+        return True
+    if vomiting != 0 and vomiting != 1:
+        return True
+    if joint_pain != 0 and joint_pain != 1:
+        return True
+    # Adjusted for actual input units
+    if rbc <= 0 or rbc > 1e6:
+        return True
+
+    # Fever rules (> 100 is covered by > 99)
+    if temp > 99 and (headache == 1 or vomiting == 1 or joint_pain == 1):
+        return True
+
+    return False
+
+
 def malaria_rule_based(inputs):
     """
     Numerical-only Malaria Risk Assessment
@@ -21,19 +49,35 @@ def malaria_rule_based(inputs):
     except:
         return "Risky"
 
-    # Check numerical ranges
-    if temp <= 0 or temp > 115:
-        return "Risky"
-    if headache not in [0, 1] or vomiting not in [0, 1] or joint_pain not in [0, 1]:
-        return "Risky"
-    # Adjusted for actual input units
-    if rbc <= 0 or rbc > 1e6:  
-        return "Risky"
+    return "Risky" if _malaria_core(temp, headache, vomiting, joint_pain, rbc) else "Normal"
 
-    # Fever rules
-    if temp > 100 and (headache or vomiting or joint_pain):
-        return "Risky"
-    if temp > 99 and (headache or vomiting or joint_pain):
-        return "Risky"
 
-    return "Normal"
\ No newline at end of file
+# Compile once at import so the first request doesn't pay for it
+_malaria_core(98.6, 0, 0, 0, 4.5)
+
+
+def malaria_rule_vec(df):
+    """
+    Vectorized malaria_rule_based over a DataFrame with one patient per row.
+
+    Returns:
+    - numpy array of "Normal" / "Risky"
+    """
+    temp = numeric_column(df, 'Temperature', 0)
+    flags = np.column_stack([
+        numeric_column(df, 'Headache', 0),
+        numeric_column(df, 'Vomiting', 0),
+        numeric_column(df, 'Joint_Pain', 0),
+    ])
+    rbc = numeric_column(df, 'rbc_count', 0)
+
+    invalid = np.isnan(temp) | np.isnan(rbc) | np.isnan(flags).any(axis=1)
+    bad_flags = ~np.isin(flags, (0, 1)).all(axis=1)
+    symptoms = (flags == 1).any(axis=1)
+
+    risky = (invalid
+             | (temp <= 0) | (temp > 115)
+             | bad_flags
+             | (rbc <= 0) | (rbc > 1e6)
+             | ((temp > 99) & symptoms))
+    return np.where(risky, "Risky", "Normal")
@@ -1,16 +1,11 @@
-def pneumonia_rule_based(inputs):
-    """
-    Pneumonia Risk Assessment:
-    Returns 'Normal' or 'Risky' based on multiple clinical parameters.
-    """
+import numpy as np
+
+from rule_based.common import jit, numeric_column
 
-    # Convert inputs safely
-    age = float(inputs.get('Age', 0))
-    cough = int(inputs.get('Cough', 0))           # severity 0-3
-    fever = float(inputs.get('Fever', 0))         # °C
-    wbc = float(inputs.get('WBC', 0))             # cells per µL
-    oxygen = float(inputs.get('Oxygen_Saturation', 0))  # %
 
+@jit
+def _pneumonia_core(age, cough, fever, wbc, oxygen):
+    """Returns the number of pneumonia risk factors present."""
     risk_factors = 0
 
     # Age risk
@@ -33,8 +28,54 @@ def pneumonia_rule_based(inputs):
     if oxygen < 92:
         risk_factors += 1
 
+    return risk_factors
+
+
+def pneumonia_rule_based(inputs):
+    """
+    Pneumonia Risk Assessment:
+    Returns 'Normal' or 'Risky' based on multiple clinical parameters.
+    """
+
+    # Convert inputs safely
+    age = float(inputs.get('Age', 0))
+    cough = int(inputs.get('Cough', 0))           # severity 0-3
+    fever = float(inputs.get('Fever', 0))         # °C
+    wbc = float(inputs.get('WBC', 0))             # cells per µL
+    oxygen = float(inputs.get('Oxygen_Saturation', 0))  # %
+
     # If any risk factor exists, mark as Risky
-    if risk_factors > 0:
+    if _pneumonia_core(age, cough, fever, wbc, oxygen) > 0:
         return "Risky"
 
     return "Normal"
+
+
+# Compile once at import so the first request doesn't pay for it
+_pneumonia_core(40.0, 0, 37.0, 7000.0, 98.0)
+
+
+def pneumonia_rule_vec(df):
+    """
+    Vectorized pneumonia_rule_based over a DataFrame with one patient per row.
+    Unparseable values count as Risky.
+
+    Returns:
+    - numpy array of "Normal" / "Risky"
+    """
+    age = numeric_column(df, 'Age', 0)
+    cough = numeric_column(df, 'Cough', 0)
+    fever = numeric_column(df, 'Fever', 0)
+    wbc = numeric_column(df, 'WBC', 0)
+    oxygen = numeric_column(df, 'Oxygen_Saturation', 0)
+
+    invalid = np.isnan(np.column_stack([age, cough, fever, wbc, oxygen])).any(axis=1)
+    risk_factors = np.add.reduce([
+        age > 60,
+        cough >= 2,
+        fever > 38,
+        wbc > 11000,
+        oxygen < 92,
+    ], dtype=np.int8)
+
+    return np.where(invalid | (risk_factors > 0), "Risky", "Normal")
@@ -1,3 +1,29 @@
+import numpy as np
+
+from rule_based.common import jit, numeric_column
+
+
+@jit
+def _thyroid_core(age, sex, tsh, t3, t4, thyroxine):
+    """Returns True when the parsed inputs are Risky."""
+    # Check age
+    if age <= 0 or age > 120:
+        return True
+
+    # Check sex
+    if sex != 0 and sex != 1:
+        return True
+
+    # On Thyroxine abnormal
+    if thyroxine != 0 and thyroxine != 1:
+        return True
+
+    # Lab ranges
+    if 0.5 <= tsh <= 4.5 and 0.8 <= t3 <= 2.0 and 4.5 <= t4 <= 12.0:
+        return False
+    return True
+
+
 def thyroid_rule(inputs):
     """
     Numerical-only Thyroid Risk Assessment
@@ -23,21 +49,33 @@ def thyroid_rule(inputs):
     except:
         return "Risky"
 
-    # Check age
-    if age <= 0 or age > 120:
-        return "Risky"
+    return "Risky" if _thyroid_core(age, sex, tsh, t3, t4, thyroxine) else "Normal"
 
-    # Check sex
-    if sex not in [0, 1]:
-        return "Risky"
 
-    # On Thyroxine abnormal
-    if thyroxine not in [0, 1]:
-        return "Risky"
+# Compile once at import so the first request doesn't pay for it
+_thyroid_core(40.0, 0, 2.0, 1.2, 8.0, 0)
 
-    # Lab ranges
-    if 0.5 <= tsh <= 4.5 and 0.8 <= t3 <= 2.0 and 4.5 <= t4 <= 12.0:
-        return "Normal"
-    else:
-        return "Risky"
 
+def thyroid_rule_vec(df):
+    """
+    Vectorized thyroid_rule over a DataFrame with one patient per row.
+
+    Returns:
+    - numpy array of "Normal" / "Risky"
+    """
+    age = numeric_column(df, 'Age', 0)
+    sex = numeric_column(df, 'Sex', -1)
+    tsh = numeric_column(df, 'TSH', 0)
+    t3 = numeric_column(df, 'T3', 0)
+    t4 = numeric_column(df, 'T4', 0)
+    thyroxine = numeric_column(df, 'Thyroxine', 0)
+
+    labs_normal = ((0.5 <= tsh) & (tsh <= 4.5)
+                   & (0.8 <= t3) & (t3 <= 2.0)
+                   & (4.5 <= t4) & (t4 <= 12.0))
+    risky = (np.isnan(age)
+             | (age <= 0) | (age > 120)
+             | ~np.isin(sex, (0, 1))
+             | ~np.isin(thyroxine, (0, 1))
+             | ~labs_normal)
+    return np.where(risky, "Risky", "Normal")
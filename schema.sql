@@ -20,6 +20,9 @@ CREATE TABLE IF NOT EXISTS predictions (
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
+-- Dashboard history lookup: WHERE user_id = ? ORDER BY timestamp DESC
+CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions (user_id, timestamp DESC);
+
 -- Contact Form Messages Table
 CREATE TABLE IF NOT EXISTS contact (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1,66 +1,168 @@
 # src/prediction_service.py
 
 import os
-import pickle
+import joblib
+from functools import lru_cache
+from importlib.util import find_spec
+from pathlib import Path
 import numpy as np
 
+from ml_pipeline import MODEL_FEATURES
+
 # Rule-based imports
-from rule_based.thyroid_rules import predict_thyroid
-from rule_based.pneumonia_rules import predict_pneumonia
-from rule_based.malaria_rules import predict_malaria
+from rule_based.thyroid_rules import thyroid_rule as predict_thyroid
+from rule_based.pneumonia_rules import pneumonia_rule_based as predict_pneumonia
+from rule_based.malaria_rules import malaria_rule_based as predict_malaria
+
+# tl2cgen is only imported once a disease actually has a compiled model
+# to serve; find_spec checks availability without importing.
+_HAS_TL2CGEN = find_spec("tl2cgen") is not None
 
 # Models folder
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "../models")
 
+MODEL_DISEASES = ("diabetes", "heart", "liver", "kidney")
+
+# Artifact paths per disease, resolved once at import
+_DIR = Path(MODEL_DIR).resolve()
+_PATHS = {
+    d: {
+        "pipeline": _DIR / f"{d}_pipeline.pkl",
+        "model": _DIR / f"{d}_model.pkl",
+        "scaler": _DIR / f"{d}_scaler.pkl",
+        "imputer": _DIR / f"{d}_imputer.pkl",
+        "lib": _DIR / f"{d}_model.so",
+    }
+    for d in MODEL_DISEASES
+}
+
 # ---------------------------
 # Model-based prediction (4 diseases)
 # ---------------------------
-def load_model_files(disease):
-    try:
-        model_path = os.path.join(MODEL_DIR, f"{disease}_model.pkl")
-        scaler_path = os.path.join(MODEL_DIR, f"{disease}_scaler.pkl")
-        imputer_path = os.path.join(MODEL_DIR, f"{disease}_imputer.pkl")
+class TreeliteModel:
+    """
+    .predict() adapter over a treelite-compiled {disease}_model.so.
+    The library returns P(class 1); labels are mapped back through the
+    sklearn model's classes_.
+    """
+
+    def __init__(self, path, classes):
+        import tl2cgen
+
+        self.predictor = tl2cgen.Predictor(path, nthread=1, verbose=False)
+        self.dmatrix = tl2cgen.DMatrix
+        self.classes_ = np.asarray(classes)
 
-        if not all(os.path.exists(p) for p in [model_path, scaler_path, imputer_path]):
-            raise FileNotFoundError(f"Model files missing for {disease}")
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        out = self.predictor.predict(self.dmatrix(X))
+        prob = out.reshape(out.shape[0], -1)[:, -1]
+        return self.classes_[(prob >= 0.5).astype(np.intp)]
 
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        with open(scaler_path, "rb") as f:
-            scaler = pickle.load(f)
-        with open(imputer_path, "rb") as f:
-            imputer = pickle.load(f)
 
-        return model, scaler, imputer
+@lru_cache(maxsize=16)
+def _load_model_files(disease):
+    """
+    Loads (model, scaler, imputer) for a disease, at most once per process.
+    Prefers the single {disease}_pipeline.pkl bundle, falling back to the
+    three separate files. The model itself is served from a compiled
+    {disease}_model.so (tl2cgen) when present. Raises on failure (failures
+    are not cached).
+    """
+    paths = _PATHS[disease]
+    model, scaler, imputer = _load_sklearn_files(disease, paths)
+
+    if _HAS_TL2CGEN and paths["lib"].exists():
+        model = TreeliteModel(os.fspath(paths["lib"]), model.classes_)
+
+    return model, scaler, imputer
+
+
+def _load_sklearn_files(disease, paths):
+    # Let the loads raise instead of stat()-ing each file first
+    try:
+        steps = joblib.load(paths["pipeline"]).named_steps
+        components = steps["model"], steps["scaler"], steps["imputer"]
+    except FileNotFoundError:
+        try:
+            components = (
+                joblib.load(paths["model"]),
+                joblib.load(paths["scaler"]),
+                joblib.load(paths["imputer"])
+            )
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Model files missing for {disease}") from e
+
+    # Legacy pickles were fitted on DataFrames; inputs here are plain arrays
+    # in feature order, so drop the column names sklearn warns about
+    for component in components:
+        if hasattr(component, "feature_names_in_"):
+            del component.feature_names_in_
+    return components
+
+
+def load_model_files(disease):
+    try:
+        return _load_model_files(disease)
     except Exception as e:
         print(f"[Error] Failed to load model files for {disease}: {e}")
         return None, None, None
 
 
-def predict_model(disease, input_features):
+def predict_model_batch(disease, X):
     """
     disease: str -> 'diabetes', 'heart', 'liver', 'kidney'
-    input_features: list or np.array of input values
+    X: array-like of shape (n_samples, n_features)
+    Returns an array of n_samples predictions, or None on failure.
+    Predicting many rows in one call amortises sklearn's per-call overhead.
     """
     model, scaler, imputer = load_model_files(disease)
     if not model:
         return None
 
     try:
-        # Convert to 2D array
-        arr = np.array(input_features).reshape(1, -1)
-        # Impute missing values
-        arr = imputer.transform(arr)
-        # Scale features
-        arr = scaler.transform(arr)
+        # Contiguous float32 so sklearn doesn't make its own copy
+        arr = np.ascontiguousarray(X, dtype=np.float32)
+        # Impute missing values (models trained without gaps save None)
+        if imputer is not None:
+            arr = imputer.transform(arr)
+        # Scale features (models without a scaler save None)
+        if scaler is not None:
+            arr = scaler.transform(arr)
         # Predict
-        pred = model.predict(arr)
-        return pred[0]
+        return model.predict(arr)
     except Exception as e:
         print(f"[Error] Prediction failed for {disease}: {e}")
         return None
 
 
+def predict_model(disease, input_features):
+    """
+    disease: str -> 'diabetes', 'heart', 'liver', 'kidney'
+    input_features: list or np.array of input values in MODEL_FEATURES
+                    order, or a dict keyed by feature name
+    """
+    features = MODEL_FEATURES[disease]
+    n = len(features)
+    try:
+        if isinstance(input_features, dict):
+            values = (input_features[k] for k in features)
+        elif len(input_features) != n:
+            raise ValueError(f"expected {n} features, got {len(input_features)}")
+        else:
+            values = input_features
+        # Typed one-shot fill: no dtype inference, no float64 intermediate
+        arr = np.fromiter(values, dtype=np.float32, count=n).reshape(1, n)
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"[Error] Invalid input for {disease}: {e}")
+        return None
+
+    preds = predict_model_batch(disease, arr)
+    if preds is None:
+        return None
+    return preds[0]
+
+
 # ---------------------------
 # Rule-based prediction (3 diseases)
 # ---------------------------
@@ -90,9 +192,12 @@ def predict(disease, input_data):
     """
     Unified prediction interface
     disease: str -> one of 7 diseases
-    input_data: list (for model-based) or dict (for rule-based)
+    input_data: list or dict (for model-based) or dict (for rule-based)
+
+    To score many rows of a model-based disease at once, call
+    predict_model_batch(disease, X) with X of shape (n_samples, n_features).
     """
-    if disease in ["diabetes", "heart", "liver", "kidney"]:
+    if disease in MODEL_DISEASES:
         return predict_model(disease, input_data)
     elif disease in ["thyroid", "pneumonia", "malaria"]:
         return predict_rule_based(disease, input_data)
@@ -103,7 +208,7 @@ def predict(disease, input_data):
 # Example usage
 if __name__ == "__main__":
     # Model-based example
-    diabetes_features = [5, 166, 72, 19, 0, 0, 0, 0]  # example values
+    diabetes_features = [5, 166, 72, 25.8, 51]  # example values
     print("Diabetes prediction:", predict("diabetes", diabetes_features))
 
     # Rule-based example